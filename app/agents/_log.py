@@ -0,0 +1,56 @@
+import logging
+import functools
+from typing import Dict, Any, Callable
+
+# Marcadores de tipo de mensagem, verificados em ordem:
+# (marcador, apenas no início da mensagem, ícone, descrição)
+_MSG_MARKERS = (
+    ("```python", False, "💻", "Bloco de código Python detectado"),
+    (">>>>>>>> EXECUTING", True, "⚡", "Execução de código iniciada"),
+    ("exitcode:", False, "🔄", "Resultado de execução recebido"),
+)
+
+def log_chat_step(message: Dict[str, Any], agent_name: str) -> None:
+    """Log detalhado de cada etapa da conversa com um agente"""
+    content = message.get("content", "")
+    role = message.get("role", "unknown")
+    name = message.get("name", "unknown")
+    
+    # Determinar direção e ícone da mensagem
+    if role == "user":
+        icon, direction = "👤", "→"
+        source, target = name, agent_name
+    else:
+        icon, direction = "🤖", "←"
+        source, target = agent_name, "user"
+    
+    # Detectar tipo de mensagem
+    msg_type = "📝"  # Texto normal
+    if not content.strip():
+        msg_type = "⚪"  # Mensagem vazia
+        logging.debug(f"{msg_type} Mensagem vazia detectada de {source}")
+    else:
+        for marker, prefix_only, marker_icon, description in _MSG_MARKERS:
+            if content.startswith(marker) if prefix_only else marker in content:
+                msg_type = marker_icon
+                logging.debug(f"{msg_type} {description}")
+                break
+    
+    # Formatar e truncar mensagem para log
+    snippet = content[:100]
+    msg_preview = snippet.replace("\n", "\\n") if content.strip() else "(vazia)"
+    if len(content) > 100:
+        msg_preview += "..."
+    
+    # Log da interação com tipo de mensagem
+    logging.info(f"{msg_type} {icon} {source} {direction} {target}: {msg_preview}")
+    
+    # Log de métricas
+    if content.strip():
+        chars = len(content)
+        lines = content.count("\n") + 1
+        logging.debug(f"📊 Métricas: {chars} caracteres, {lines} linhas")
+
+def make_chat_logger(agent_name: str) -> Callable[[Dict[str, Any]], None]:
+    """Retorna log_chat_step especializado para o agente informado"""
+    return functools.partial(log_chat_step, agent_name=agent_name)
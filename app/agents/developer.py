@@ -1,10 +1,13 @@
 import logging
-from typing import Optional, Dict, Any
+import functools
+from typing import Optional
 import re
 import autogen  # type: ignore
 from autogen import AssistantAgent
 from app.config import Config
+from app import llm_cache
 from app.state import StateManager
+from app.agents._log import make_chat_logger
 
 DEVELOPER_SYSTEM_MESSAGE = """
 Você é o Desenvolvedor (Developer).
@@ -53,6 +56,45 @@ CRÍTICO: Use aspas simples triplas (''') no f.write(), NÃO aspas duplas.
 Não use emojis no print (causam erro de encoding).
 """
 
+# Início de uma definição de função (compilado uma única vez)
+_FUNC_DEF_RE = re.compile(r"def\s+(\w+)\s*\(")
+
+# Docstring no início do corpo: ignora espaços e comentários e aceita aspas
+# triplas escapadas (\"\"\"), usadas quando o código é gravado via f.write
+_DOCSTRING_START_RE = re.compile(r"(?:\s|#[^\n]*+)*[rRuU]?(?:\\?\"\\?\"\\?\"|''')")
+
+# Conteúdo de testes que não pode aparecer na implementação
+_FORBIDDEN_IN_IMPL_RE = re.compile(r"def test_|import pytest")
+
+# UserProxyAgent reutilizado entre iterações para receber as respostas
+_USER_PROXY = autogen.UserProxyAgent(
+    name="user_proxy",
+    human_input_mode="NEVER",
+    code_execution_config={"use_docker": False}
+)
+
+def _body_start(code: str, pos: int) -> int:
+    """
+    Posição do corpo de uma função: logo após o ':' que fecha o cabeçalho.
+    
+    Args:
+        code: Código fonte
+        pos: Posição logo após o '(' da definição
+    
+    Returns:
+        int: Início do corpo, -1 se o cabeçalho não terminar
+    """
+    depth = 1
+    for i in range(pos, len(code)):
+        char = code[i]
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        elif char == ":" and depth == 0:
+            return i + 1
+    return -1
+
 def validate_implementation(code: str) -> Optional[str]:
     """
     Validar código implementado.
@@ -64,26 +106,23 @@ def validate_implementation(code: str) -> Optional[str]:
         return "Código vazio gerado"
     
     # Verificar se contém testes
-    if "def test_" in code or "import pytest" in code:
+    if _FORBIDDEN_IN_IMPL_RE.search(code):
         return "Código contém testes (deve estar em arquivo separado)"
     
     # Verificar se há pelo menos uma função
-    if "def " not in code:
+    funcs = list(_FUNC_DEF_RE.finditer(code))
+    if not funcs:
         return "Nenhuma função implementada"
     
-    # Verificar docstrings
-    func_pattern = r"def\s+(\w+)\s*\("
-    funcs = re.finditer(func_pattern, code)
+    # Verificar docstrings (o corpo de cada função deve começar por uma)
     for match in funcs:
-        func_name = match.group(1)
-        func_pos = match.start()
-        next_lines = code[func_pos:func_pos + 200]  # Próximas linhas após função
-        if '"""' not in next_lines and "'''" not in next_lines:
-            return f"Função {func_name} não tem docstring"
+        body = _body_start(code, match.end())
+        if body < 0 or not _DOCSTRING_START_RE.match(code, body):
+            return f"Função {match.group(1)} não tem docstring"
     
     return None
 
-def generate_code(state: StateManager) -> None:
+async def generate_code(state: StateManager) -> None:
     """
     Gerar/atualizar implementação baseada nos testes e feedback.
     
@@ -104,81 +143,47 @@ def generate_code(state: StateManager) -> None:
     
     # Criar agente e gerar código
     agent = get_agent()
+    # Conteúdo estável primeiro e volátil por último, para aproveitar o
+    # cache de prefixo do provedor entre iterações
     context = f"""
     TESTES ATUAIS:
     {tests}
     
-    FEEDBACK (se houver):
-    {feedback}
-    
     CÓDIGO ANTERIOR (se houver):
     {prev_code}
+    
+    FEEDBACK (se houver):
+    {feedback}
     """
     
-    # Criar um UserProxyAgent para receber a resposta
-    user_proxy = autogen.UserProxyAgent(
-        name="user_proxy",
-        human_input_mode="NEVER",
-        code_execution_config={"use_docker": False}
-    )
+    # Reutilizar o UserProxyAgent do módulo, limpando o histórico anterior
+    user_proxy = _USER_PROXY
+    user_proxy.reset()
     
     # Iniciar chat com o agente
     logging.info("💬 Iniciando conversa com Developer...")
     
-    def log_chat_step(message: Dict[str, Any]) -> None:
-        """Log detalhado de cada etapa da conversa"""
-        content = message.get("content", "")
-        role = message.get("role", "unknown")
-        name = message.get("name", "unknown")
-        
-        # Determinar direção e ícone da mensagem
-        if role == "user":
-            icon, direction = "👤", "→"
-            source, target = name, agent.name
-        else:
-            icon, direction = "🤖", "←"
-            source, target = agent.name, "user"
-            
-        # Detectar tipo de mensagem
-        msg_type = "📝"  # Texto normal
-        if not content.strip():
-            msg_type = "⚪"  # Mensagem vazia
-            logging.debug(f"{msg_type} Mensagem vazia detectada de {source}")
-        elif "```python" in content:
-            msg_type = "�"  # Código Python
-            logging.debug(f"{msg_type} Bloco de código Python detectado")
-        elif content.startswith(">>>>>>>> EXECUTING"):
-            msg_type = "⚡"  # Execução
-            logging.debug(f"{msg_type} Execução de código iniciada")
-        elif "exitcode:" in content:
-            msg_type = "🔄"  # Resultado de execução
-            logging.debug(f"{msg_type} Resultado de execução recebido")
-        
-        # Formatar e truncar mensagem para log
-        msg_preview = content.replace("\n", "\\n")[:100] if content.strip() else "(vazia)"
-        if len(content) > 100:
-            msg_preview += "..."
-            
-        # Log da interação com tipo de mensagem
-        logging.info(f"{msg_type} {icon} {source} {direction} {target}: {msg_preview}")
+    log_chat_step = make_chat_logger(agent.name)
+    
+    message = f"Implemente código para passar nos testes:\n{context}"
+    
+    async def call_developer() -> str:
+        """Conversar com o Developer e extrair o código da resposta"""
+        # Iniciar chat com callback de logging
+        response = await user_proxy.a_initiate_chat(
+            agent,
+            message=message,
+            callback=log_chat_step
+        )
+        logging.info("💬 Conversa com Developer finalizada")
         
-        # Log de métricas
-        if content.strip():
-            chars = len(content)
-            lines = len(content.split("\n"))
-            logging.debug(f"📊 Métricas: {chars} caracteres, {lines} linhas")
-    
-    # Iniciar chat com callback de logging
-    response = user_proxy.initiate_chat(
-        agent,
-        message=f"Implemente código para passar nos testes:\n{context}",
-        callback=log_chat_step
-    )
-    logging.info("💬 Conversa com Developer finalizada")
+        # Extrair o código da última mensagem do assistente
+        return next((msg["content"] for msg in reversed(response.chat_history)
+                     if msg["role"] == "assistant"), "")
     
-    # Extrair o código da última mensagem do assistente
-    assistant_messages = [msg for msg in response.chat_history if msg["role"] == "assistant"]
-    code = assistant_messages[-1]["content"] if assistant_messages else ""
+    # Reutilizar resposta em cache para o mesmo prompt (apenas código válido)
+    cache_key = llm_cache.make_key(DEVELOPER_SYSTEM_MESSAGE, message)
+    code = await llm_cache.a_get_or_call(cache_key, call_developer, validate_implementation)
     
     # Validar implementação
     if error := validate_implementation(code):
@@ -189,8 +194,8 @@ def generate_code(state: StateManager) -> None:
         else:
             raise ValueError(f"Falha ao gerar código válido: {error}")
     
-    # Salvar implementação
-    state.save_implementation_file(code)
+    # Salvar implementação (em segundo plano)
+    state.submit_io(state.save_implementation_file, code)
     
     # Atualizar estado
     state.update(
@@ -199,12 +204,13 @@ def generate_code(state: StateManager) -> None:
     )
     
     # Preview do código
-    preview = code.split('\n')[:10]
+    preview = code.split('\n', 10)[:10]
     logging.info("📄 Preview da implementação:")
     for line in preview:
         logging.info(line)
     logging.info("...")
 
+@functools.lru_cache(maxsize=1)
 def get_agent() -> AssistantAgent:
     """Retorna uma instância do Agente Desenvolvedor"""
     return AssistantAgent(
@@ -1,3 +1,4 @@
+import functools
 from autogen import AssistantAgent   # type: ignore
 from app.config import llm_config
 
@@ -15,6 +16,7 @@ O plano deve seguir o ciclo TDD:
 Responda *apenas* com o plano. Comece o plano com "Plano de TDD:".
 """
 
+@functools.lru_cache(maxsize=1)
 def get_agent() -> AssistantAgent:
     """
     Retorna uma instância do Agente Planejador.
@@ -1,6 +1,8 @@
 import re
+import asyncio
 import logging
-from typing import Dict, List, Optional
+import functools
+from typing import Dict, List, Optional, Tuple
 from autogen import AssistantAgent  # type: ignore
 from app.config import Config
 from app.state import StateManager
@@ -32,6 +34,10 @@ Para review de código bem-sucedido:
 Seja preciso e direto em seu feedback.
 """
 
+# Padrões de extração da saída do pytest (compilados uma única vez)
+_TEST_RESULT_RE = re.compile(r"(PASSED|FAILED|ERROR)\s+(test_[\w\d_]+)", re.IGNORECASE)
+_ERROR_RE = re.compile(r"(test_[\w\d_]+).*?\n(.*?)(?=\n\n|$)", re.DOTALL)
+
 def extract_test_results(output: str) -> Dict[str, List[str]]:
     """
     Extrair resultados detalhados dos testes da saída do pytest.
@@ -46,8 +52,7 @@ def extract_test_results(output: str) -> Dict[str, List[str]]:
     }
     
     # Procurar por resultados de teste no formato pytest
-    test_pattern = r"(PASSED|FAILED|ERROR)\s+(test_[\w\d_]+)"
-    matches = re.finditer(test_pattern, output, re.IGNORECASE)
+    matches = _TEST_RESULT_RE.finditer(output)
     
     for match in matches:
         status, test_name = match.groups()
@@ -61,13 +66,27 @@ def extract_test_results(output: str) -> Dict[str, List[str]]:
     
     return results
 
-def analyze_failures(output: str, state: Optional[StateManager] = None) -> str:
+def _scan_error_messages(output: str) -> List[Tuple[str, str]]:
+    """
+    Extrair mensagens de erro associadas a cada teste da saída do pytest.
+    
+    Returns:
+        Lista de tuplas (nome do teste, mensagem de erro)
+    """
+    error_matches = _ERROR_RE.finditer(output)
+    return [(match.group(1), match.group(2).strip()) for match in error_matches]
+
+async def analyze_failures(output: str, state: Optional[StateManager] = None,
+                           enable_parallel: bool = False) -> str:
     """
     Analisar saída de teste com falha e gerar feedback.
     
     Args:
         output: Saída do pytest
         state: Estado atual do TDD (opcional)
+        enable_parallel: Extrair resultados e mensagens de erro em paralelo
+            (padrão: False). Por causa do GIL só compensa para saídas muito
+            grandes, e as mensagens são extraídas mesmo sem falhas
     
     Returns:
         str: Feedback formatado para o Developer
@@ -82,9 +101,16 @@ def analyze_failures(output: str, state: Optional[StateManager] = None) -> str:
         
     logging.info("📊 Iniciando análise detalhada dos resultados...")
     
-    # Extrair resultados
+    # Extrair resultados e mensagens de erro
     logging.info("🔍 Extraindo resultados dos testes...")
-    results = extract_test_results(output)
+    if enable_parallel:
+        results, errors = await asyncio.gather(
+            asyncio.to_thread(extract_test_results, output),
+            asyncio.to_thread(_scan_error_messages, output)
+        )
+    else:
+        results = extract_test_results(output)
+        errors = None  # extraídas apenas se houver falhas
     
     # Gerar relatório
     logging.info("📝 Gerando relatório detalhado...")
@@ -114,16 +140,15 @@ def analyze_failures(output: str, state: Optional[StateManager] = None) -> str:
         for test in results["errors"]:
             feedback.append(f"⚠️ {test}")
         
-        # Extrair mensagens de erro específicas
-        error_pattern = r"(test_[\w\d_]+).*?\n(.*?)(?=\n\n|$)"
-        error_matches = re.finditer(error_pattern, output, re.DOTALL)
+        # Mensagens de erro específicas
+        if errors is None:
+            errors = _scan_error_messages(output)
         
         feedback.append("\nCausas das Falhas:")
-        for match in error_matches:
-            test_name, error_msg = match.groups()
+        for test_name, error_msg in errors:
             if test_name in (results["failed"] + results["errors"]):
                 feedback.append(f"- {test_name}:")
-                feedback.append(f"  {error_msg.strip()}")
+                feedback.append(f"  {error_msg}")
     
     # Atualizar estado se fornecido
     if state:
@@ -139,6 +164,7 @@ def analyze_failures(output: str, state: Optional[StateManager] = None) -> str:
     
     return "\n".join(feedback)
 
+@functools.lru_cache(maxsize=1)
 def get_agent() -> AssistantAgent:
     """Retorna uma instância do Agente Revisor"""
     return AssistantAgent(
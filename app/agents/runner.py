@@ -1,53 +1,103 @@
+import io
+import re
 import logging
+import importlib
+import contextlib
 import subprocess
 import sys
-from typing import Optional
+from typing import Optional, Tuple
 import os
+from pathlib import Path
 from app.config import Config
 from app.state import StateManager
 
-def run_tests(state: Optional[StateManager] = None) -> str:
+# Palavras de status na saída do pytest (compilado uma única vez)
+_STATUS_RE = re.compile(r"\b(passed|failed|errors?)\b", re.IGNORECASE)
+
+# Bloco shell contendo apenas uma chamada ao pytest para um arquivo
+_PYTEST_CMD_RE = re.compile(r"```(?:sh|bash|shell)?\n\s*(?:python -m )?pytest\s+(\S+\.py)(?:\s+-v)?\s*\n```")
+
+def _run_pytest_in_process(test_path: str) -> Tuple[int, str]:
+    """Executar pytest no processo atual, reaproveitando o pytest já importado"""
+    import pytest
+    
+    # Descartar módulos da execução anterior para carregar o código atualizado
+    importlib.invalidate_caches()
+    for module in (Config.IMPLEMENTATION_MODULE, os.path.splitext(Config.TEST_FILE)[0]):
+        sys.modules.pop(module, None)
+    
+    logging.debug(f"🔧 pytest.main: {test_path} -v")
+    buffer = io.StringIO()
+    with contextlib.redirect_stdout(buffer), contextlib.redirect_stderr(buffer):
+        exit_code = pytest.main([test_path, "-v", "-p", "no:cacheprovider"])
+    
+    logging.debug(f"📊 pytest finalizado: código {exit_code}")
+    return int(exit_code), buffer.getvalue()
+
+def _run_pytest_subprocess(test_path: str) -> Tuple[int, str]:
+    """Executar pytest em um processo separado (isolamento de plugins)"""
+    # Log do comando
+    cmd = [sys.executable, "-m", "pytest", test_path, "-v"]
+    logging.debug(f"🔧 Comando: {' '.join(cmd)}")
+    
+    # Executar pytest com verbose, lendo a saída (stdout + stderr) à medida
+    # que é produzida em vez de aguardar o fim do processo
+    lines = []
+    with subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
+    ) as process:
+        for line in process.stdout:
+            lines.append(line)
+            logging.debug(f"🧪 {line.rstrip()}")
+    
+    logging.debug(f"📊 Processo finalizado: código {process.returncode}")
+    return process.returncode, "".join(lines)
+
+def run_tests(state: Optional[StateManager] = None, in_process: bool = True,
+              test_path: Optional[Path] = None) -> str:
     """
     Executar testes pytest e retornar saída.
     
     Args:
         state: Estado atual do TDD (opcional)
+        in_process: Executar pytest no processo atual (padrão: True);
+            False usa um subprocesso separado
+        test_path: Arquivo de teste (padrão: Config.TEST_FILE_PATH)
     
     Returns:
         str: Saída completa do pytest
     """
-    test_path = os.path.join(Config.WORKSPACE_PATH, Config.TEST_FILE)
+    # Os arquivos de teste/implementação precisam estar gravados
+    if state:
+        state.wait_io()
+    
+    test_path = test_path or Config.TEST_FILE_PATH
     
-    if not os.path.exists(test_path):
+    if not test_path.exists():
         msg = f"❌ Arquivo de teste não encontrado: {test_path}"
         logging.error(msg)
         return msg
     
     try:
-        # Log do comando
-        cmd = [sys.executable, "-m", "pytest", test_path, "-v"]
         logging.info("⚡ Executando testes...")
-        logging.debug(f"🔧 Comando: {' '.join(cmd)}")
-        
-        # Executar pytest com verbose
-        process = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            check=False  # Não levantar erro se testes falharem
-        )
-        
-        logging.debug(f"📊 Processo finalizado: código {process.returncode}")
-        
-        # Combinar stdout e stderr
-        output = process.stdout or ""
-        if process.stderr:
-            output += "\n" + process.stderr
+        if in_process:
+            _, output = _run_pytest_in_process(str(test_path))
+        else:
+            _, output = _run_pytest_subprocess(str(test_path))
         
         # Detectar status
         if state:
-            has_passed = "passed" in output.lower()
-            has_failures = "failed" in output.lower() or "error" in output.lower()
+            has_passed = has_failures = False
+            for match in _STATUS_RE.finditer(output):
+                if match.group(1).lower() == "passed":
+                    has_passed = True
+                else:
+                    has_failures = True
+                    break  # Uma falha já define o status
             
             if has_passed and not has_failures:
                 state.update(status="passed")
@@ -72,9 +122,46 @@ def run_tests(state: Optional[StateManager] = None) -> str:
         logging.error(msg)
         return msg
 
+def _truncate_output(output: str) -> str:
+    """Manter apenas as primeiras e últimas linhas da saída do pytest"""
+    lines = output.splitlines()
+    head, tail = Config.PYTEST_OUTPUT_HEAD_LINES, Config.PYTEST_OUTPUT_TAIL_LINES
+    if len(lines) <= head + tail:
+        return output
+    
+    omitted = len(lines) - head - tail
+    marker = f"... ({omitted} linhas omitidas, saída completa em {Config.PYTEST_LOG_PATH.name}) ..."
+    return "\n".join(lines[:head] + [marker] + lines[-tail:])
+
+def run_pytest_command(message: str, work_dir: str) -> Optional[str]:
+    """
+    Executar no processo atual um bloco shell que apenas chama o pytest.
+    A saída enviada ao chat é truncada (ver _truncate_output).
+    
+    Args:
+        message: Conteúdo da mensagem recebida pelo executor
+        work_dir: Diretório de trabalho do executor
+    
+    Returns:
+        str: Resultado no formato do executor do autogen, None se a
+            mensagem não for um comando pytest
+    """
+    match = _PYTEST_CMD_RE.search(message)
+    if not match:
+        return None
+    
+    exit_code, output = _run_pytest_in_process(os.path.join(work_dir, match.group(1)))
+    
+    # Saída completa em arquivo; no chat, apenas início e fim (tamanho limitado)
+    Config.PYTEST_LOG_PATH.write_text(output, encoding="utf-8")
+    output = _truncate_output(output)
+    
+    status = "execution succeeded" if exit_code == 0 else "execution failed"
+    return f"exitcode: {exit_code} ({status})\nCode output: {output}"
+
 def create_empty_implementation() -> None:
     """Criar arquivo de implementação vazio para fase RED"""
-    path = os.path.join(Config.WORKSPACE_PATH, f"{Config.IMPLEMENTATION_MODULE}.py")
+    path = Config.IMPLEMENTATION_FILE_PATH
     logging.info("🔧 Criando arquivo de implementação vazio...")
     
     with open(path, "w", encoding="utf-8") as f:
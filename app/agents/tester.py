@@ -1,9 +1,13 @@
+import re
 import logging
-from typing import Optional, Dict, Any
+import functools
+from typing import Optional
 import autogen  # type: ignore
 from autogen import AssistantAgent
 from app.config import Config
+from app import llm_cache
 from app.state import StateManager
+from app.agents._log import make_chat_logger
 
 TESTER_SYSTEM_MESSAGE = """
 Você é o Engenheiro de Testes TDD (Tester).
@@ -49,6 +53,16 @@ print("Testes criados em: workspace/test_app.py")
 CRÍTICO: Use aspas simples triplas (''') no f.write(), NÃO aspas duplas.
 """
 
+# Definições de função que não são testes (compilado uma única vez)
+_NON_TEST_DEF_RE = re.compile(r"^[ \t]*(def (?!test_).*?)\s*$", re.MULTILINE)
+
+# UserProxyAgent reutilizado entre iterações para receber as respostas
+_USER_PROXY = autogen.UserProxyAgent(
+    name="user_proxy",
+    human_input_mode="NEVER",
+    code_execution_config={"use_docker": False}
+)
+
 def validate_tests(tests: str) -> Optional[str]:
     """
     Validar conteúdo dos testes gerados.
@@ -67,21 +81,19 @@ def validate_tests(tests: str) -> Optional[str]:
         f"import {module_name}" not in tests):
         return f"Testes não importam de '{module_name}'"
     
-    # Verificar se há implementação nos testes
+    # Verificar se há implementação nos testes (fixtures são permitidas)
     non_test_funcs = []
-    for line in tests.split('\n'):
-        stripped = line.strip()
-        if (stripped.startswith('def ') and 
-            'def test_' not in stripped and 
-            '@pytest.fixture' not in tests[max(0, tests.find(line)-100):tests.find(line)]):
-            non_test_funcs.append(stripped)
+    for match in _NON_TEST_DEF_RE.finditer(tests):
+        line_start = match.start()
+        if '@pytest.fixture' not in tests[max(0, line_start-100):line_start]:
+            non_test_funcs.append(match.group(1))
     
     if non_test_funcs:
         return f"Testes contêm implementação: {non_test_funcs}"
     
     return None
 
-def generate_tests(specification: str, state: StateManager) -> None:
+async def generate_tests(specification: str, state: StateManager) -> None:
     """
     Gerar testes baseados na especificação.
     
@@ -107,81 +119,48 @@ def generate_tests(specification: str, state: StateManager) -> None:
     logging.info("🔧 Configurando agentes para geração de testes...")
     agent = get_agent()
     
-    # Criar um UserProxyAgent para receber a resposta
-    user_proxy = autogen.UserProxyAgent(
-        name="user_proxy",
-        human_input_mode="NEVER",
-        code_execution_config={"use_docker": False}
-    )
+    # Reutilizar o UserProxyAgent do módulo, limpando o histórico anterior
+    user_proxy = _USER_PROXY
+    user_proxy.reset()
     logging.debug("✓ Agentes configurados")
     
     # Configurar logging detalhado da conversa
-    def log_chat_step(message: Dict[str, Any]) -> None:
-        """Log detalhado de cada etapa da conversa"""
-        content = message.get("content", "")
-        role = message.get("role", "unknown")
-        name = message.get("name", "unknown")
-        
-        # Determinar direção e ícone da mensagem
-        if role == "user":
-            icon, direction = "👤", "→"
-            source, target = name, agent.name
-        else:
-            icon, direction = "🤖", "←"
-            source, target = agent.name, "user"
-            
-        # Detectar tipo de mensagem
-        msg_type = "📝"  # Texto normal
-        if not content.strip():
-            msg_type = "⚪"  # Mensagem vazia
-            logging.debug(f"{msg_type} Mensagem vazia detectada de {source}")
-        elif "```python" in content:
-            msg_type = "💻"  # Código Python
-            logging.debug(f"{msg_type} Bloco de código Python detectado")
-        elif content.startswith(">>>>>>>> EXECUTING"):
-            msg_type = "⚡"  # Execução
-            logging.debug(f"{msg_type} Execução de código iniciada")
-        elif "exitcode:" in content:
-            msg_type = "🔄"  # Resultado de execução
-            logging.debug(f"{msg_type} Resultado de execução recebido")
-        
-        # Formatar e truncar mensagem para log
-        msg_preview = content.replace("\n", "\\n")[:100] if content.strip() else "(vazia)"
-        if len(content) > 100:
-            msg_preview += "..."
-            
-        # Log da interação com tipo de mensagem
-        logging.info(f"{msg_type} {icon} {source} {direction} {target}: {msg_preview}")
-        
-        # Log de métricas
-        if content.strip():
-            chars = len(content)
-            lines = len(content.split("\n"))
-            logging.debug(f"� Métricas: {chars} caracteres, {lines} linhas")
+    log_chat_step = make_chat_logger(agent.name)
     
     # Iniciar processo de geração
     logging.info("\n" + "=" * 40)
     logging.info("💬 INICIANDO GERAÇÃO DE TESTES")
     logging.info("=" * 40)
     
-    # Iniciar chat com callback de logging
-    response = user_proxy.initiate_chat(
-        agent,
-        message=f"Gere testes pytest para: {specification}",
-        callback=log_chat_step
-    )
-    
-    logging.info("💬 Conversa com Tester finalizada")
+    message = f"Gere testes pytest para: {specification}"
+    if previous_tests:
+        # Regeneração: o prompt (e a chave de cache) muda a cada tentativa
+        message += f"\n\nTESTES ANTERIORES (gere uma nova versão):\n{previous_tests}"
+    
+    async def call_tester() -> str:
+        """Conversar com o Tester e extrair os testes da resposta"""
+        # Iniciar chat com callback de logging
+        response = await user_proxy.a_initiate_chat(
+            agent,
+            message=message,
+            callback=log_chat_step
+        )
+        
+        logging.info("💬 Conversa com Tester finalizada")
+        
+        # Extrair e processar resposta
+        logging.info("🔍 Processando resposta do Tester...")
+        return next((msg["content"] for msg in reversed(response.chat_history)
+                     if msg["role"] == "assistant"), "")
     
-    # Extrair e processar resposta
-    logging.info("🔍 Processando resposta do Tester...")
-    assistant_messages = [msg for msg in response.chat_history if msg["role"] == "assistant"]
+    # Reutilizar resposta em cache para o mesmo prompt (apenas testes válidos)
+    cache_key = llm_cache.make_key(TESTER_SYSTEM_MESSAGE, message)
+    tests = await llm_cache.a_get_or_call(cache_key, call_tester, validate_tests)
     
-    if not assistant_messages:
+    if not tests:
         logging.error("❌ Nenhuma resposta válida do Tester!")
         raise ValueError("Tester não gerou resposta")
         
-    tests = assistant_messages[-1]["content"]
     logging.info(f"✓ Resposta extraída ({len(tests)} chars)")
     
     # Validar testes gerados
@@ -200,7 +179,7 @@ def generate_tests(specification: str, state: StateManager) -> None:
     
     # Salvar testes
     logging.info("💾 Salvando testes em arquivo...")
-    state.save_test_file(tests)
+    state.submit_io(state.save_test_file, tests)
     
     # Atualizar estado
     logging.info("📊 Atualizando estado do TDD...")
@@ -214,13 +193,14 @@ def generate_tests(specification: str, state: StateManager) -> None:
     logging.info("\n" + "=" * 40)
     logging.info("📄 PREVIEW DOS TESTES GERADOS")
     logging.info("=" * 40)
-    preview = tests.split('\n')[:10]
-    for line in preview:
+    preview = tests.split('\n', 10)
+    for line in preview[:10]:
         logging.info(line)
-    if len(tests.split('\n')) > 10:
+    if len(preview) > 10:
         logging.info("...")
     logging.info("=" * 40)
 
+@functools.lru_cache(maxsize=1)
 def get_agent() -> AssistantAgent:
     """Retorna uma instância do Agente de Testes"""
     return AssistantAgent(
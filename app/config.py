@@ -1,5 +1,7 @@
 import os
 import logging
+import functools
+from pathlib import Path
 from typing import Dict, Any
 from dotenv import load_dotenv
 
@@ -7,9 +9,24 @@ load_dotenv()
 
 class Config:
     # Paths e arquivos
-    WORKSPACE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "workspace")
+    BASE_PATH = Path(__file__).resolve().parent.parent
+    WORKSPACE_PATH = BASE_PATH / "workspace"
     TEST_FILE = "test_app.py"
     IMPLEMENTATION_MODULE = "app_code"
+    LLM_CACHE_PATH = BASE_PATH / ".cache" / "llm"
+    AUTOGEN_CACHE_PATH = BASE_PATH / ".cache" / "autogen"
+    ACTION_CACHE_PATH = BASE_PATH / ".cache" / "tdd_action"
+    
+    # Caminhos absolutos resolvidos uma única vez na importação
+    TEST_FILE_PATH = WORKSPACE_PATH / TEST_FILE
+    IMPLEMENTATION_FILE_PATH = WORKSPACE_PATH / f"{IMPLEMENTATION_MODULE}.py"
+    
+    # Arquivos gerados pelo chat em grupo: o Executor roda com work_dir em
+    # WORKSPACE_PATH e os prompts gravam em 'workspace/<arquivo>'
+    GENERATED_DIR = "workspace"
+    GENERATED_PATH = WORKSPACE_PATH / GENERATED_DIR
+    GENERATED_TEST_FILE_PATH = GENERATED_PATH / TEST_FILE
+    GENERATED_IMPLEMENTATION_FILE_PATH = GENERATED_PATH / f"{IMPLEMENTATION_MODULE}.py"
     
     # Configuração OpenAI
     OPENAI_API_KEY = os.getenv("OAI_API_KEY")
@@ -20,6 +37,11 @@ class Config:
     MAX_ITERATIONS = 5  # Máximo de tentativas de refatoração
     MAX_TEST_REGENERATIONS = 3  # Máximo de tentativas de regenerar testes
     
+    # Saída do pytest enviada ao chat (início + fim); a completa fica em arquivo
+    PYTEST_OUTPUT_HEAD_LINES = 50
+    PYTEST_OUTPUT_TAIL_LINES = 50
+    PYTEST_LOG_PATH = WORKSPACE_PATH / ".last_pytest.log"
+    
     # Logging
     LOG_FORMAT = "%(asctime)s [%(levelname)s] %(message)s"
     LOG_LEVEL = logging.INFO
@@ -33,8 +55,9 @@ class Config:
         )
     
     @classmethod
+    @functools.cache
     def get_llm_config(cls) -> Dict[str, Any]:
-        """Retorna configuração do LLM para autogen"""
+        """Retorna configuração do LLM para autogen (construída uma única vez)"""
         return {
             "config_list": [{
                 "model": "gpt-4o-mini",
@@ -0,0 +1,69 @@
+import os
+import json
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional, Callable, Awaitable
+from app.config import Config
+
+def make_key(system_message: str, message: str) -> str:
+    """Gerar chave SHA-256 a partir do prompt completo enviado ao LLM"""
+    return hashlib.sha256((system_message + message).encode("utf-8")).hexdigest()
+
+def _cache_path(key: str) -> Path:
+    """Caminho do arquivo de cache para a chave"""
+    return Config.LLM_CACHE_PATH / f"{key}.json"
+
+def get(key: str) -> Optional[str]:
+    """
+    Obter resposta armazenada no cache.
+    
+    Returns:
+        str: Resposta em cache, None se não houver
+    """
+    path = _cache_path(key)
+    if not path.exists():
+        return None
+    
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)["response"]
+    except (OSError, ValueError, KeyError) as e:
+        logging.warning(f"⚠️ Cache de LLM inválido ({key[:12]}): {e}")
+        return None
+
+def put(key: str, response: str) -> None:
+    """Armazenar resposta do LLM no cache"""
+    os.makedirs(Config.LLM_CACHE_PATH, exist_ok=True)
+    with open(_cache_path(key), "w", encoding="utf-8") as f:
+        json.dump({"response": response}, f, ensure_ascii=False)
+
+def _log_hit(key: str, response: str) -> None:
+    """Log de acerto no cache com estimativa de tokens economizados"""
+    tokens_saved = len(response) // 4  # ~4 caracteres por token
+    logging.info(f"♻️ Resposta do LLM obtida do cache ({key[:12]}), ~{tokens_saved} tokens economizados")
+
+async def a_get_or_call(key: str, fn: Callable[[], Awaitable[str]],
+                        validate: Optional[Callable[[str], Optional[str]]] = None) -> str:
+    """
+    Retornar resposta em cache ou chamar o LLM e armazenar o resultado.
+    
+    Args:
+        key: Chave do prompt (ver make_key)
+        fn: Função que executa a chamada ao LLM
+        validate: Validação da resposta (mensagem de erro ou None); apenas
+            respostas válidas são armazenadas ou reaproveitadas
+    
+    Returns:
+        str: Resposta do LLM
+    """
+    if (cached := get(key)) is not None:
+        if validate is None or validate(cached) is None:
+            _log_hit(key, cached)
+            return cached
+        logging.warning(f"⚠️ Resposta em cache inválida ({key[:12]}), chamando o LLM novamente")
+    
+    response = await fn()
+    if response and (validate is None or validate(response) is None):
+        put(key, response)
+    return response
@@ -1,56 +1,92 @@
 import os
+import re
 import time
+import json
+import shutil
+import asyncio
+import hashlib
 import logging
-import autogen  # type: ignore
-from typing import Dict, Any, List, Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Any, List, Optional, Tuple
 
 from app.config import Config
 from app.state import StateManager, TDDState
-from app.agents.planner import get_agent as get_planner
-from app.agents.tester import get_agent as get_tester, generate_tests
-from app.agents.developer import get_agent as get_developer, generate_code
-from app.agents.reviewer import get_agent as get_reviewer, analyze_failures
-from app.agents.runner import run_tests, create_empty_implementation
+from app.agents.runner import run_tests, run_pytest_command
+
+# autogen e os módulos de agentes são importados sob demanda (importação
+# pesada), para que importar app.main não pague esse custo
+if TYPE_CHECKING:
+    import autogen  # type: ignore
+
+# Ícone por tipo de mensagem do chat em grupo, verificados em ordem:
+# (marcador, apenas no início da mensagem, ícone)
+_MSG_ICONS = (
+    ("```python", False, "💻"),  # Código Python
+    (">>>>>>>> EXECUTING", True, "⚡"),  # Execução
+    ("exitcode:", False, "🔄"),  # Resultado de execução
+    ("Plano de TDD:", True, "📋"),  # Plano
+)
+
+# Marcadores usados na seleção de speaker, detectados em uma única passagem.
+# Em cada posição vale a primeira alternativa: "test_app.py" também indica
+# "test" e "exitcode: 0" também indica "exitcode:"
+_FLOW_RE = re.compile(
+    r"(?P<code>```python)|(?P<test_file>test_app\.py)|(?P<impl_file>app_code\.py)"
+    r"|(?P<exit_ok>exitcode: 0)|(?P<exit>exitcode:)|(?P<terminate>TERMINATE)"
+    r"|(?P<result>(?i:test|passed|failed))"
+)
 
 class TDDOrchestrator:
     """Orquestrador do fluxo TDD usando autogen"""
     
-    def _log_group_message(self, sender_name: str, receiver_name: str, message: str) -> None:
+    @staticmethod
+    def _log_group_message(sender_name: str, receiver_name: str, message: str) -> None:
         """Log detalhado de cada mensagem do chat em grupo"""
         if not message or not message.strip():
-            logging.debug(f"⚪ Mensagem vazia: {sender_name} → {receiver_name}")
+            logging.debug("⚪ Mensagem vazia: %s → %s", sender_name, receiver_name)
             return
         
         # Determinar tipo e ícone da mensagem
-        msg_type = "📝"  # Texto normal
-        if "```python" in message:
-            msg_type = "💻"  # Código Python
-        elif message.startswith(">>>>>>>> EXECUTING"):
-            msg_type = "⚡"  # Execução
-        elif "exitcode:" in message:
-            msg_type = "🔄"  # Resultado de execução
-        elif message.startswith("Plano de TDD:"):
-            msg_type = "📋"  # Plano
-        
-        # Formatar e truncar mensagem para log
-        msg_preview = message.replace("\n", "\\n")[:100]
+        msg_type = next((icon for marker, prefix_only, icon in _MSG_ICONS
+                         if (message.startswith(marker) if prefix_only else marker in message)), "📝")
+        
+        # Formatar e truncar mensagem para log (truncar antes de escapar)
+        msg_preview = message[:100].replace("\n", "\\n")
         if len(message) > 100:
             msg_preview += "..."
         
         # Log da interação com tipo de mensagem
         logging.info("-" * 80)  # Linha separadora
-        logging.info(f"{msg_type} {sender_name} → {receiver_name}: {msg_preview}")
+        logging.info("%s %s → %s: %s", msg_type, sender_name, receiver_name, msg_preview)
         
         # Log de métricas em modo debug
-        chars = len(message)
-        lines = len(message.split("\n"))
-        logging.debug(f"📊 Métricas: {chars} caracteres, {lines} linhas")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            chars = len(message)
+            lines = message.count("\n") + 1
+            logging.debug("📊 Métricas: %d caracteres, %d linhas", chars, lines)
+    
+    @staticmethod
+    def _log_message_hook(sender: Any, message: Any, recipient: Any, silent: bool) -> Any:
+        """Hook process_message_before_send: log de cada mensagem enviada"""
+        content = message.get("content", "") if isinstance(message, dict) else message
+        TDDOrchestrator._log_group_message(sender.name, recipient.name, content if isinstance(content, str) else "")
+        return message
     
     def __init__(self):
         """Inicializar orquestrador TDD"""
-        self.workspace_dir = Config.WORKSPACE_PATH
+        import autogen  # type: ignore
+        from app.agents.planner import get_agent as get_planner
+        from app.agents.tester import get_agent as get_tester
+        from app.agents.developer import get_agent as get_developer
+        from app.agents.reviewer import get_agent as get_reviewer
+        
+        self.workspace_dir = str(Config.WORKSPACE_PATH)
         os.makedirs(self.workspace_dir, exist_ok=True)
         
+        # Estado do ciclo em execução (definido em run)
+        self.state: Optional[StateManager] = None
+        self._terminated = False  # TERMINATE recebido do Reviewer
+        
         # Inicializar agentes
         self.planner = get_planner()
         self.tester = get_tester()
@@ -69,42 +105,13 @@ class TDDOrchestrator:
             self.reviewer
         ]
         
-        # Configurar função de log para cada agente
+        # Registrar log de mensagens: um hook por agente cobre send e a_send,
+        # e cada mensagem do chat em grupo é enviada uma única vez ao manager
+        # (os agentes são compartilhados entre orquestradores: registrar uma vez)
         for agent in self.agents:
-            # Salvar referências originais
-            agent._original_receive = agent.receive
-            agent._original_send = agent.send
-            orchestrator = self  # Referência para usar nas closures
-            
-            def make_receive_with_log(agent):
-                def receive_with_log(self, message: Dict[str, Any], sender: Any, *args, **kwargs) -> None:
-                    try:
-                        sender_name = getattr(sender, "name", "unknown")
-                        content = message.get("content", "")
-                        orchestrator._log_group_message(sender_name, agent.name, content)
-                    except Exception as e:
-                        logging.debug(f"Erro ao fazer log de mensagem recebida: {e}")
-                    return agent._original_receive(message, sender, *args, **kwargs)
-                return receive_with_log
-            
-            def make_send_with_log(agent):
-                def send_with_log(self, message: Dict[str, Any], recipient: Any, *args, **kwargs) -> None:
-                    try:
-                        recipient_name = getattr(recipient, "name", "unknown")
-                        content = message.get("content", "")
-                        orchestrator._log_group_message(agent.name, recipient_name, content)
-                    except Exception as e:
-                        logging.debug(f"Erro ao fazer log de mensagem enviada: {e}")
-                    return agent._original_send(message, recipient, *args, **kwargs)
-                return send_with_log
-            
-            # Substituir métodos com versões que fazem logging
-            try:
-                agent.receive = make_receive_with_log(agent).__get__(agent)
-                agent.send = make_send_with_log(agent).__get__(agent)
-                logging.debug(f"✓ Logging configurado para agente: {agent.name}")
-            except Exception as e:
-                logging.error(f"❌ Erro ao configurar logging para agente {agent.name}: {e}")
+            if self._log_message_hook not in agent.hook_lists["process_message_before_send"]:
+                agent.register_hook("process_message_before_send", self._log_message_hook)
+                logging.debug("✓ Logging configurado para agente: %s", agent.name)
         
         # Configurar chat em grupo com seleção manual
         def custom_speaker_selection(last_speaker, groupchat):
@@ -115,7 +122,8 @@ class TDDOrchestrator:
             
             last_msg = messages[-1]
             speaker_name = last_speaker.name if last_speaker else None
-            content = last_msg.get("content", "")
+            content = last_msg.get("content", "") or ""
+            hits = {match.lastgroup for match in _FLOW_RE.finditer(content)}
             
             # Fluxo TDD:
             # 1. Planner → Tester
@@ -123,19 +131,22 @@ class TDDOrchestrator:
                 return self.tester
             
             # 2. Tester envia código → Executor executa
-            elif speaker_name == "Tester" and "```python" in content:
+            elif speaker_name == "Tester" and "code" in hits:
                 return self.executor
             
             # 3. Executor criou test_app.py → Developer
-            elif speaker_name == "Executor" and "test_app.py" in content and "exitcode: 0" in content:
+            elif speaker_name == "Executor" and {"test_file", "exit_ok"} <= hits:
                 return self.developer
             
             # 4. Developer envia código → Executor executa
-            elif speaker_name == "Developer" and "```python" in content:
+            elif speaker_name == "Developer" and "code" in hits:
+                # Cada código enviado pelo Developer é uma iteração do ciclo
+                if self.state:
+                    self.state.update(iteration=self.state.get("iteration", 0) + 1)
                 return self.executor
             
             # 5. Executor criou app_code.py → chamar Runner (função helper) via mensagem
-            elif speaker_name == "Executor" and "app_code.py" in content and "exitcode: 0" in content:
+            elif speaker_name == "Executor" and {"impl_file", "exit_ok"} <= hits:
                 # Injetar comando pytest
                 import os
                 if os.path.exists(os.path.join(self.workspace_dir, "test_app.py")):
@@ -144,12 +155,13 @@ class TDDOrchestrator:
                 return self.executor
             
             # 6. Resultado de pytest → Reviewer
-            elif speaker_name == "Executor" and "exitcode:" in content and ("test" in content.lower() or "passed" in content.lower() or "failed" in content.lower()):
+            elif speaker_name == "Executor" and hits & {"exit_ok", "exit"} and hits & {"test_file", "result"}:
                 return self.reviewer
             
             # 7. Reviewer → TERMINATE ou Developer corrige
             elif speaker_name == "Reviewer":
-                if "TERMINATE" in content:
+                if "terminate" in hits:
+                    self._terminated = True
                     return None
                 else:
                     return self.developer
@@ -168,15 +180,35 @@ class TDDOrchestrator:
         self.manager = autogen.GroupChatManager(
             groupchat=self.groupchat,
             llm_config=Config.get_llm_config(),
-            system_message=self._get_manager_prompt()
+            system_message=self._get_manager_prompt(),
+            is_termination_msg=self._is_termination_msg
         )
     
-    def _setup_executor(self) -> autogen.UserProxyAgent:
+    def _is_termination_msg(self, message: Dict[str, Any]) -> bool:
+        """Critério de término do manager (padrão do autogen), registrando o TERMINATE"""
+        from autogen.code_utils import content_str  # type: ignore
+        if content_str(message.get("content")) == "TERMINATE":
+            self._terminated = True
+            return True
+        return False
+    
+    def _reset_agents(self) -> None:
+        """Limpar histórico e contadores dos agentes reutilizados entre execuções"""
+        for agent in self.agents + [self.manager]:
+            agent.reset()
+        self.groupchat.reset()
+    
+    def _setup_executor(self) -> "autogen.UserProxyAgent":
         """Configurar agente executor"""
+        import autogen  # type: ignore
+        
         executor = autogen.UserProxyAgent(
             name="Executor",
             human_input_mode="NEVER",
-            max_consecutive_auto_reply=10,
+            # No chat assíncrono cada turno do Executor conta duas vezes (o
+            # a_generate_reply do autogen executa as versões sync e async da
+            # verificação de término): 20 preserva o limite de 10 turnos
+            max_consecutive_auto_reply=20,
             is_termination_msg=lambda x: "TERMINATE" in x.get("content", ""),
             code_execution_config={
                 "work_dir": self.workspace_dir,
@@ -185,8 +217,26 @@ class TDDOrchestrator:
             system_message="Execute código Python e comandos shell."
         )
         
+        # Comandos pytest rodam no processo atual (sem iniciar um shell e
+        # um novo interpretador a cada rodada); demais códigos seguem no shell.
+        # Registrado após as verificações de término do autogen, para que as
+        # rodadas de pytest respeitem is_termination_msg e contem para
+        # max_consecutive_auto_reply
+        termination_checks = (autogen.ConversableAgent.check_termination_and_human_reply,
+                              autogen.ConversableAgent.a_check_termination_and_human_reply)
+        position = 1 + max(i for i, reply in enumerate(executor._reply_func_list)
+                           if reply["reply_func"] in termination_checks)
+        executor.register_reply([autogen.Agent, None], self._pytest_reply, position=position)
+        
         return executor
     
+    def _pytest_reply(self, recipient: Any, messages: Optional[List[Dict[str, Any]]] = None,
+                      sender: Any = None, config: Any = None) -> Tuple[bool, Optional[str]]:
+        """Reply do executor: executar pytest no processo atual"""
+        content = (messages[-1].get("content") if messages else None) or ""
+        result = run_pytest_command(content, self.workspace_dir)
+        return result is not None, result
+    
     def _get_manager_prompt(self) -> str:
         """Retorna prompt do manager com fluxo TDD"""
         return """
@@ -205,7 +255,7 @@ CRÍTICO: Após Tester ou Developer enviar código, o próximo SEMPRE é Executo
 Executor deve responder após executar cada código/comando.
         """
     
-    def run(self, specification: str) -> TDDState:
+    async def run(self, specification: str) -> TDDState:
         """
         Executar fluxo TDD completo.
         
@@ -218,16 +268,31 @@ Executor deve responder após executar cada código/comando.
         logging.info("=" * 60)
         logging.info("INICIANDO WORKFLOW TDD")
         logging.info("=" * 60)
-        logging.info(f"\n📋 Especificação:\n{specification}\n")
+        logging.info("\n📋 Especificação:\n%s\n", specification)
+        
+        # Agentes em cache podem trazer mensagens de uma execução anterior
+        self._reset_agents()
+        self._terminated = False
         
         # Inicializar estado
         state = StateManager(specification)
+        self.state = state
         
         # Limpar workspace
-        if os.path.exists(self.workspace_dir):
-            for f in os.listdir(self.workspace_dir):
-                if f.endswith('.py'):
-                    os.remove(os.path.join(self.workspace_dir, f))
+        for path in Config.WORKSPACE_PATH.glob("*.py"):
+            path.unlink(missing_ok=True)
+        
+        # Reaproveitar o resultado de uma execução anterior da mesma especificação
+        spec_key = hashlib.sha256(specification.strip().encode("utf-8")).hexdigest()
+        action_dir = Config.ACTION_CACHE_PATH / spec_key
+        if self._restore_action_cache(action_dir, state):
+            self._print_final_report(state)
+            return state.state
+        
+        # Remover arquivos gerados anteriormente (ou restaurados sem sucesso),
+        # para que o cache só armazene o que este chat gravar
+        for path in (Config.GENERATED_TEST_FILE_PATH, Config.GENERATED_IMPLEMENTATION_FILE_PATH):
+            path.unlink(missing_ok=True)
         
         # Executar fluxo TDD - UMA ÚNICA VEZ
         try:
@@ -235,38 +300,110 @@ Executor deve responder após executar cada código/comando.
             logging.info("💬 INICIANDO CICLO TDD")
             logging.info("=" * 60)
             
-            chat_response = self.executor.initiate_chat(
-                self.manager,
-                message=f"Implemente uma solução TDD para: {specification}"
-            )
+            # Cache em disco das chamadas ao LLM, particionado pela especificação
+            from autogen import Cache  # type: ignore
+            with Cache.disk(cache_seed=spec_key[:16],
+                            cache_path_root=str(Config.AUTOGEN_CACHE_PATH)) as cache:
+                chat_response = await self.executor.a_initiate_chat(
+                    self.manager,
+                    message=f"Implemente uma solução TDD para: {specification}",
+                    cache=cache
+                )
+            self._log_cache_usage()
+            
+            # TERMINATE é registrado pela seleção de speaker / critério de término
+            if self._terminated:
+                logging.info("🎉 Ciclo TDD concluído com sucesso! (TERMINATE recebido)")
+                state.update(status="passed")
             
-            # Verificar se alguma mensagem contém TERMINATE
-            if self.groupchat.messages:
-                last_messages = self.groupchat.messages[-10:]  # Verificar últimas 10 mensagens
-                for msg in last_messages:
-                    content = msg.get("content", "")
-                    if "TERMINATE" in content:
-                        logging.info("🎉 Ciclo TDD concluído com sucesso! (TERMINATE recebido)")
-                        state.update(status="passed")
-                        break
+            if state.get("status") == "passed":
+                self._save_action_cache(action_dir)
         
         except Exception as e:
-            logging.error(f"❌ Erro no ciclo TDD: {str(e)}")
+            logging.error("❌ Erro no ciclo TDD: %s", e)
             state.update(status="error")
         
         # Relatório final
         self._print_final_report(state)
         return state.state
     
+    def _usage_tokens(self) -> Tuple[int, int]:
+        """Retorna (tokens totais, tokens cobrados) usados pelos agentes no chat"""
+        from autogen import gather_usage_summary  # type: ignore
+        usage = gather_usage_summary(self.agents + [self.manager])
+        
+        def total_tokens(summary: Dict[str, Any]) -> int:
+            return sum(v.get("total_tokens", 0) for v in summary.values() if isinstance(v, dict))
+        
+        return (total_tokens(usage["usage_including_cached_inference"]),
+                total_tokens(usage["usage_excluding_cached_inference"]))
+    
+    def _log_cache_usage(self) -> None:
+        """Log de tokens servidos pelo cache do LLM durante o chat"""
+        total, billed = self._usage_tokens()
+        logging.info("♻️ Cache do LLM: %d de %d tokens servidos do cache", total - billed, total)
+    
+    def _restore_action_cache(self, action_dir: Path, state: StateManager) -> bool:
+        """
+        Restaurar testes e implementação de uma execução anterior bem-sucedida.
+        
+        Args:
+            action_dir: Diretório do cache para a especificação
+            state: Estado atual do TDD
+        
+        Returns:
+            bool: True se os arquivos foram restaurados e os testes passaram
+        """
+        cached_files = [action_dir / Config.GENERATED_TEST_FILE_PATH.name,
+                        action_dir / Config.GENERATED_IMPLEMENTATION_FILE_PATH.name]
+        if not all(path.exists() for path in cached_files):
+            return False
+        
+        logging.info("♻️ Especificação já resolvida anteriormente: restaurando arquivos do cache")
+        os.makedirs(Config.GENERATED_PATH, exist_ok=True)
+        for path in cached_files:
+            shutil.copy2(path, Config.GENERATED_PATH)
+        
+        run_tests(state, test_path=Config.GENERATED_TEST_FILE_PATH)
+        if state.get("status") != "passed":
+            logging.warning("⚠️ Arquivos em cache não passaram nos testes, executando ciclo completo")
+            return False
+        
+        tokens_saved = 0
+        meta_path = action_dir / "meta.json"
+        if meta_path.exists():
+            try:
+                tokens_saved = json.loads(meta_path.read_text(encoding="utf-8")).get("total_tokens", 0)
+            except (OSError, ValueError) as e:
+                logging.warning("⚠️ meta.json do cache inválido (%s): %s", action_dir.name[:12], e)
+        logging.info("🎉 Ciclo TDD reaproveitado do cache (~%d tokens economizados)", tokens_saved)
+        return True
+    
+    def _save_action_cache(self, action_dir: Path) -> None:
+        """Armazenar testes e implementação de uma execução bem-sucedida"""
+        generated_files = [Config.GENERATED_TEST_FILE_PATH, Config.GENERATED_IMPLEMENTATION_FILE_PATH]
+        if not all(path.exists() for path in generated_files):
+            logging.warning("⚠️ Arquivos gerados não encontrados, resultado não armazenado em cache")
+            return
+        
+        os.makedirs(action_dir, exist_ok=True)
+        for path in generated_files:
+            shutil.copy2(path, action_dir)
+        
+        total_tokens, _ = self._usage_tokens()
+        (action_dir / "meta.json").write_text(json.dumps({"total_tokens": total_tokens}), encoding="utf-8")
+        logging.info("💾 Resultado do ciclo TDD armazenado em cache: %s", action_dir)
+    
     def _print_final_report(self, state: StateManager) -> None:
         """Imprimir relatório final do TDD"""
         logging.info("=" * 60)
         logging.info("📊 RELATÓRIO FINAL DO TDD")
         logging.info("=" * 60)
-        logging.info(f"✅ Status: {state.get('status', 'unknown')}")
-        logging.info(f"🔄 Mensagens no chat: {len(self.groupchat.messages)}")
-        logging.info(f"📄 Implementação: {Config.WORKSPACE_PATH}/{Config.IMPLEMENTATION_MODULE}.py")
-        logging.info(f"📄 Testes: {Config.WORKSPACE_PATH}/{Config.TEST_FILE}")
+        logging.info("✅ Status: %s", state.get('status', 'unknown'))
+        logging.info("🔄 Mensagens no chat: %d", len(self.groupchat.messages))
+        logging.info("🔁 Iterações do Developer: %d", state.get('iteration', 0))
+        logging.info("📄 Implementação: %s", Config.GENERATED_IMPLEMENTATION_FILE_PATH)
+        logging.info("📄 Testes: %s", Config.GENERATED_TEST_FILE_PATH)
         
         if state.get("status") == "passed":
             logging.info("\n🎉 Ciclo TDD concluído com sucesso!")
@@ -291,7 +428,7 @@ def main():
     """
 
     orchestrator = TDDOrchestrator()
-    state = orchestrator.run(user_request)
+    state = asyncio.run(orchestrator.run(user_request))
 
     logging.info("🏁 Sistema TDD AutoGen finalizado.")
     return state
@@ -302,4 +439,4 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logging.info("\n⚠️ Execução interrompida pelo usuário")
     except Exception as e:
-        logging.error(f"\n❌ Erro fatal: {str(e)}")
+        logging.error("\n❌ Erro fatal: %s", e)
@@ -1,10 +1,18 @@
-from typing import Dict, Any, Optional
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Callable
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor, Future, wait
 from app.config import Config
 
+# Escritas em disco fora do caminho crítico (um único worker preserva a ordem)
+_IO_POOL = ThreadPoolExecutor(max_workers=1)
+
 class TDDState:
     """Estado do fluxo TDD"""
+    __slots__ = ("specification", "tests", "code", "feedback",
+                 "status", "iteration", "test_phase", "previous_tests")
+    
     def __init__(self, specification: str = "") -> None:
         self.specification: str = specification
         self.tests: str = ""
@@ -31,27 +39,30 @@ class TDDState:
     def update(self, updates: Dict[str, Any]) -> None:
         """Atualizar estado a partir de dicionário"""
         for key, value in updates.items():
-            if hasattr(self, key):
+            if key in _VALID_KEYS:
                 setattr(self, key, value)
 
+# Chaves válidas para atualização do estado
+_VALID_KEYS = frozenset(TDDState.__slots__)
+
+# Chaves cujas mudanças são registradas em log
+_RELEVANT_STATE_KEYS = frozenset(("status", "test_phase", "iteration"))
+
 class StateManager:
     """Gerencia o estado do fluxo TDD"""
     
     def __init__(self, specification: str):
         """Inicializar gerenciador de estado"""
         self.state = TDDState(specification)
+        self._pending_io: List[Future] = []
         
         # Garantir workspace
         os.makedirs(Config.WORKSPACE_PATH, exist_ok=True)
     
     def update(self, **kwargs) -> None:
         """Atualizar estado com novos valores"""
-        # Validar que as chaves são válidas para TDDState
-        valid_keys = {'specification', 'tests', 'code', 'feedback', 
-                     'status', 'iteration', 'test_phase', 'previous_tests'}
-        
-        # Filtrar apenas chaves válidas
-        validated_updates = {k: v for k, v in kwargs.items() if k in valid_keys}
+        # Filtrar apenas chaves válidas para TDDState
+        validated_updates = {k: v for k, v in kwargs.items() if k in _VALID_KEYS}
         
         if not validated_updates:
             logging.warning("⚠️ Nenhuma atualização válida fornecida")
@@ -67,21 +78,43 @@ class StateManager:
     
     def _log_state_change(self, changes: Dict[str, Any]) -> None:
         """Log de mudanças relevantes no estado"""
-        relevant = {k: v for k, v in changes.items() 
-                   if k in ['status', 'test_phase', 'iteration']}
+        if not logging.getLogger().isEnabledFor(logging.DEBUG):
+            return
+        
+        relevant = {k: changes[k] for k in _RELEVANT_STATE_KEYS if k in changes}
         if relevant:
-            logging.debug(f"Estado atualizado: {relevant}")
+            logging.debug("Estado atualizado: %s", relevant)
+    
+    def submit_io(self, fn: Callable[..., None], *args: Any) -> None:
+        """Agendar operação de escrita em segundo plano"""
+        self._pending_io.append(_IO_POOL.submit(fn, *args))
+    
+    def wait_io(self) -> None:
+        """Aguardar escritas pendentes, propagando eventuais erros"""
+        pending, self._pending_io = self._pending_io, []
+        wait(pending)
+        for future in pending:
+            future.result()
+    
+    @staticmethod
+    def _write_file(path: Path, content: str) -> None:
+        """Gravar arquivo de forma atômica (temporário + os.replace), sem camada de texto"""
+        data = memoryview(content.encode("utf-8"))
+        tmp_path = path.with_name(path.name + ".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            while data:
+                data = data[os.write(fd, data):]
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, path)
     
     def save_test_file(self, content: str) -> None:
         """Salvar arquivo de teste"""
-        path = os.path.join(Config.WORKSPACE_PATH, Config.TEST_FILE)
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(content)
+        self._write_file(Config.TEST_FILE_PATH, content)
         logging.info(f"✅ Testes salvos em: {Config.TEST_FILE}")
     
     def save_implementation_file(self, content: str) -> None:
         """Salvar arquivo de implementação"""
-        path = os.path.join(Config.WORKSPACE_PATH, f"{Config.IMPLEMENTATION_MODULE}.py")
-        with open(path, "w", encoding="utf-8") as f:
-            f.write(content)
+        self._write_file(Config.IMPLEMENTATION_FILE_PATH, content)
         logging.info(f"✅ Código salvo em: {Config.IMPLEMENTATION_MODULE}.py")
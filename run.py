@@ -9,7 +9,6 @@ import sys
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
-from app.main import main
-
 if __name__ == "__main__":
+    from app.main import main
     main()